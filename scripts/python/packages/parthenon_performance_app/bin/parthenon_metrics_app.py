@@ -301,6 +301,7 @@ def main(**kwargs):
         kwargs["permissions"],
         kwargs["create"],
         getValue(kwargs, "repository_path"),
+        kwargs["prefetch"],
     )
 
     branch = getValue(kwargs, "branch")
@@ -441,6 +442,14 @@ if __name__ == "__main__":
         "--get-target-branch", "-gtb", action="store_true", default=False, help=desc
     )
 
+    desc = (
+        "Concurrently prefetch the branches and tree of the default branch "
+        "when initializing the application."
+    )
+    parser.add_argument(
+        "--prefetch", "-pf", action="store_true", default=False, help=desc
+    )
+
     args = parser.parse_args()
 
     main(**vars(args))
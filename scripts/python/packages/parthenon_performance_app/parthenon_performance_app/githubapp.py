@@ -13,22 +13,32 @@
 # =========================================================================================
 
 import os
+import sys
+import atexit
+import asyncio
 import logging
 import datetime
 import filecmp
-import pathlib
-import json
 import shutil
 import base64
-from io import BytesIO
+import hashlib
+import mmap
+from urllib.parse import quote
+import orjson
 import jwt
-import pem
-import pycurl
+from cryptography.hazmat.primitives.serialization import load_pem_private_key
+import httpx
 from git import Repo
 import git
 
+# Directory of this module, where the app config files are stored
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 
 class Node:
+    # A node is created for every directory of the tree, slots avoid a dict per instance
+    __slots__ = ("dir", "dirs", "files", "misc", "rel_path")
+
     def __init__(self, dir_name="", rel_path=""):
         """
         Creating a Node object
@@ -65,14 +75,20 @@ class Node:
         return self.rel_path
 
     def printTree(self):
-        """Print contents of node and all child nodes."""
-        self._log.info("Contents in folder: " + self.rel_path)
-        for fil in self.files:
-            self._log.info("File " + fil)
-        for mis in self.misc:
-            self._log.info("Misc " + mis)
-        for node in self.dirs:
-            node.printTree()
+        """
+        Print contents of node and all child nodes.
+
+        The tree is traversed depth first with an explicit stack and written in a single call.
+        """
+        out = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            out.append("Contents in folder: " + node.rel_path)
+            out.extend("File " + fil for fil in node.files)
+            out.extend("Misc " + mis for mis in node.misc)
+            stack.extend(reversed(node.dirs))
+        sys.stdout.write("\n".join(out) + "\n")
 
 
 class GitHubApp:
@@ -84,6 +100,41 @@ class GitHubApp:
     with the github api.
     """
 
+    # Caches shared by all app instances for the lifetime of the process. The parsed private key
+    # is keyed by the path of the pem file, the json web token (and its expiry) by the app id and
+    # pem file path, and the installation id by the app id.
+    _key_cache = {}
+    _jwt_cache = {}
+    _install_id_cache = {}
+
+    # GraphQL queries only request the fields that are used by the app
+    _branches_query = """
+        query($owner: String!, $name: String!, $cursor: String) {
+          repository(owner: $owner, name: $name) {
+            refs(refPrefix: "refs/heads/", first: 100, after: $cursor) {
+              pageInfo { hasNextPage endCursor }
+              nodes { name target { oid } }
+            }
+          }
+        }
+        """
+    _contents_query = """
+        query($owner: String!, $name: String!, $expression: String!) {
+          repository(owner: $owner, name: $name) {
+            object(expression: $expression) {
+              ... on Tree { entries { name oid type } }
+            }
+          }
+        }
+        """
+    _file_query = """
+        query($owner: String!, $name: String!, $expression: String!) {
+          repository(owner: $owner, name: $name) {
+            object(expression: $expression) { __typename oid }
+          }
+        }
+        """
+
     def __init__(self, app_id, name, user, repo_name, path_to_app_instance):
         """
         The app is generic and provides a template, to create an app for a specefic repository the
@@ -98,6 +149,7 @@ class GitHubApp:
         self._name = name
         self._user = user
         self._repo_name = repo_name
+        self._session = None
 
         self._log = logging.getLogger(self._repo_name)
         self._log.setLevel(logging.INFO)
@@ -110,14 +162,14 @@ class GitHubApp:
         ch.setLevel(logging.DEBUG)
         self._log.addHandler(ch)
 
-        self._config_file_dir = pathlib.Path(__file__).parent.absolute()
+        self._config_file_dir = _MODULE_DIR
         self._config_file_name = "githubapp_" + str(self._app_id) + ".config"
-        self._config_file_path = pathlib.Path.joinpath(
+        self._config_file_path = os.path.join(
             self._config_file_dir, self._config_file_name
         )
 
         # Create an empty config file if one does not exist
-        if not pathlib.Path.is_file(self._config_file_path):
+        if not os.path.isfile(self._config_file_path):
             open(self._config_file_path, "a").close()
 
     def initialize(
@@ -127,6 +179,7 @@ class GitHubApp:
         pem_file="",
         create_branch=False,
         path_to_repo=None,
+        prefetch=False,
     ):
         """
         Sets basic properties of the app should be called before any other methods
@@ -138,6 +191,8 @@ class GitHubApp:
         ignore - if this is set to true than images will not be uploaded to a seperate figures
         branch on the main repository. By default binary files are uploaded to a orphan branch so
         as to prevent bloatting the commit history.
+        prefetch - if this is set to true the branches and the tree of the default branch are
+        requested concurrently once authenticated.
 
         The initialization method is also responsible for authenticating with github and creating
         an access token. The access token is needed to do any further communication or run any other
@@ -155,7 +210,10 @@ class GitHubApp:
         self._default_branch = "develop"
         self._default_image_branch = "figures"
         self._branches = []
+        self._branches_set = set()
         self._branch_current_commit_sha = {}
+        # Maps the url of a GET request to the ETag and json object of its last response
+        self._etag_cache = {}
         self._api_version = "application/vnd.github.v3+json"
         self._parth_root = Node()
 
@@ -185,7 +243,7 @@ class GitHubApp:
                 raise
         else:
 
-            if pathlib.Path.is_file(self._config_file_path):
+            if os.path.isfile(self._config_file_path):
 
                 with open(self._config_file_path, "r") as file:
                     line = file.readline()
@@ -216,25 +274,79 @@ class GitHubApp:
             self._generateJWT(pem_file[0])
         else:
             self._generateJWT(pem_file)
+
+        # A single pooled HTTP/2 client is shared by all requests made to the github api, so that
+        # the TLS handshake is reused and requests are multiplexed over the same connection. The
+        # client is closed when the interpreter exits, or when the app is initialized again.
+        if self._session is not None:
+            atexit.unregister(self._session.close)
+            self._session.close()
+        self._session = httpx.Client(
+            transport=httpx.HTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+                retries=3,
+            ),
+            headers={"Accept": self._api_version, "Content-Type": "application/json"},
+            timeout=httpx.Timeout(30.0),
+            follow_redirects=True,
+        )
+        atexit.register(self._session.close)
+
         self._generateInstallationId()
         self._generateAccessToken()
 
+        if prefetch:
+            asyncio.run(self._warmup())
+
+    async def _warmup(self):
+        """
+        Concurrently requests the information most commonly needed from the github api
+
+        The branches and the tree of the default branch do not depend on each other so they are
+        requested at the same time. The responses populate the branch attributes, the ETag cache
+        entry later revalidated by getBranchTreeFast and the tree of the app. Failing to get the
+        tree is not fatal, it is only logged.
+        """
+        async with self._asyncSession() as session:
+            _, js_obj = await asyncio.gather(
+                self._getBranchesAsync(session),
+                self._prefetchTreeAsync(session),
+            )
+
+        if js_obj is None:
+            return
+        if js_obj.get("truncated", False):
+            self._log.warning(
+                "Tree of branch %s is truncated, it will not be prefetched"
+                % self._default_branch
+            )
+        else:
+            self._parth_root = self._buildTree(js_obj["tree"])
+
+    async def _prefetchTreeAsync(self, session):
+        """Returns the tree of the default branch, or None and a warning if it cannot be fetched."""
+        try:
+            return await self._getJSONAsync(
+                self._treeUrl(self._default_branch), session
+            )
+        except Exception as error:
+            self._log.warning(
+                "Tree of branch %s could not be prefetched: %s"
+                % (self._default_branch, error)
+            )
+            return None
+
     def _generateJWT(self, pem_file):
         """
         Generates Json web token
 
         Method will take the permissions (.pem) file provided and populate the json web token
-        attribute
+        attribute. The token is reused by all instances of the app signing with the same pem file
+        until it is close to expiring. The pem file is only parsed the first time it is
+        encountered, the parsed key is kept for the lifetime of the process, so a key file that is
+        replaced in place is not re-read.
         """
-        # iss is the app id
-        # Ensuring that we request an access token that expires after a minute
-        payload = {
-            "iat": datetime.datetime.utcnow(),
-            "exp": datetime.datetime.utcnow() + datetime.timedelta(seconds=60),
-            "iss": self._app_id,
-        }
-
-        PEM = ""
         if pem_file == "":
             if "GITHUB_APP_PEM" in os.environ:
                 pem_file = os.environ.get("GITHUB_APP_PEM")
@@ -242,61 +354,67 @@ class GitHubApp:
                 error_msg = "A pem file has not been specified and GITHUB_APP_PEM env varaible is not defined"
                 raise Exception(error_msg)
 
-        self._log.info("File loc %s" % pem_file)
-        certs = pem.parse_file(pem_file)
-        PEM = str(certs[0])
+        now = datetime.datetime.utcnow()
+        cached = GitHubApp._jwt_cache.get((self._app_id, pem_file))
+        if cached is not None and cached[1] - now > datetime.timedelta(seconds=10):
+            self._jwt_token = cached[0]
+            return
 
-        if PEM == "":
-            error_msg = (
-                "No permissions enabled for parthenon metrics app, either a pem file needs to "
-                "be provided or the GITHUB_APP_PEM variable needs to be defined"
-            )
-            raise Exception(error_msg)
-        self._jwt_token = jwt.encode(payload, PEM, algorithm="RS256").decode("utf-8")
+        # iss is the app id
+        # Ensuring that we request an access token that expires after a minute
+        expiration = now + datetime.timedelta(seconds=60)
+        payload = {
+            "iat": now,
+            "exp": expiration,
+            "iss": self._app_id,
+        }
 
-    @staticmethod
-    def _PYCURL(header, url, option=None, custom_data=None):
-        buffer_temp = BytesIO()
-        c = pycurl.Curl()
-        c.setopt(c.URL, url)
-        c.setopt(pycurl.VERBOSE, 0)
-        c.setopt(c.WRITEDATA, buffer_temp)
-        c.setopt(c.HTTPHEADER, header)
-        if option == "POST":
-            c.setopt(c.POST, 1)
-            c.setopt(c.POSTFIELDS, json.dumps(custom_data))
-            c.setopt(c.POSTFIELDSIZE, len(json.dumps(custom_data)))
-        elif option == "PUT":
-            c.setopt(c.PUT, 1)
-
-        if custom_data is not None:
-            buffer_temp2 = BytesIO(json.dumps(custom_data).encode("utf-8"))
-            c.setopt(c.READDATA, buffer_temp2)
-
-        c.perform()
-        c.close()
-
-        return json.loads(buffer_temp.getvalue())
+        self._log.info("File loc %s" % pem_file)
+        if pem_file not in GitHubApp._key_cache:
+            with open(pem_file, "rb") as f:
+                PEM = f.read()
+
+            if not PEM.strip():
+                error_msg = (
+                    "No permissions enabled for parthenon metrics app, either a pem file needs to "
+                    "be provided or the GITHUB_APP_PEM variable needs to be defined"
+                )
+                raise Exception(error_msg)
+            GitHubApp._key_cache[pem_file] = load_pem_private_key(PEM, password=None)
+
+        self._jwt_token = jwt.encode(
+            payload, GitHubApp._key_cache[pem_file], algorithm="RS256"
+        ).decode("utf-8")
+        GitHubApp._jwt_cache[(self._app_id, pem_file)] = (
+            self._jwt_token,
+            expiration,
+        )
 
     def _generateInstallationId(self):
         """
         Generate an installation id
 
         This method will populate the installation id attribute using the internally stored json
-        web token.
+        web token. The installation id of an app does not change so it is only requested once.
         """
-        header = [
-            "Authorization: Bearer " + str(self._jwt_token),
-            "Accept: " + self._api_version,
-        ]
+        if self._app_id in GitHubApp._install_id_cache:
+            self._install_id = GitHubApp._install_id_cache[self._app_id]
+            return
 
-        js_obj = self._PYCURL(header, "https://api.github.com/app/installations")
+        header = {"Authorization": "Bearer " + str(self._jwt_token)}
+
+        js_obj = orjson.loads(
+            self._session.get(
+                "https://api.github.com/app/installations", headers=header
+            ).content
+        )
 
         if isinstance(js_obj, list):
             js_obj = js_obj[0]
 
         # The installation id will be listed at the end of the url path
         self._install_id = js_obj["html_url"].rsplit("/", 1)[-1]
+        GitHubApp._install_id_cache[self._app_id] = self._install_id
 
     def _generateAccessToken(self):
         """
@@ -305,10 +423,7 @@ class GitHubApp:
         This method will populate the installation attribute using the installation id. The token
         is needed to authenticate any actions run by the application.
         """
-        header = [
-            "Authorization: Bearer " + str(self._jwt_token),
-            "Accept: " + self._api_version,
-        ]
+        header = {"Authorization": "Bearer " + str(self._jwt_token)}
 
         https_url_access_tokens = (
             "https://api.github.com/app/installations/"
@@ -316,64 +431,195 @@ class GitHubApp:
             + "/access_tokens"
         )
 
-        js_obj = self._PYCURL(header, https_url_access_tokens, option="POST")
+        js_obj = orjson.loads(
+            self._session.post(https_url_access_tokens, headers=header).content
+        )
 
         if isinstance(js_obj, list):
             js_obj = js_obj[0]
 
         self._access_token = js_obj["token"]
 
-        self._header = [
-            "Authorization: token " + self._access_token,
-            "Accept: " + self._api_version,
-        ]
+        self._session.headers.update({"Authorization": "token " + self._access_token})
+
+    def _gql(self, query, variables):
+        """Runs a query against the github GraphQL api and returns the data of the response."""
+        response = self._session.post(
+            "https://api.github.com/graphql",
+            content=orjson.dumps({"query": query, "variables": variables}),
+        )
+        self._checkResponse(response, "GraphQL query")
+        js_obj = orjson.loads(response.content)
+        if "errors" in js_obj:
+            raise Exception("GraphQL query failed: " + str(js_obj["errors"]))
+        return js_obj["data"]
+
+    async def _gqlAsync(self, query, variables, session):
+        """Asynchronous counterpart of _gql making use of an asynchronous client."""
+        response = await session.post(
+            "https://api.github.com/graphql",
+            content=orjson.dumps({"query": query, "variables": variables}),
+        )
+        self._checkResponse(response, "GraphQL query")
+        js_obj = orjson.loads(response.content)
+        if "errors" in js_obj:
+            raise Exception("GraphQL query failed: " + str(js_obj["errors"]))
+        return js_obj["data"]
+
+    def _getJSON(self, url):
+        """
+        Makes a conditional GET request and returns the json object of the response
+
+        The ETag of each response is cached along with its json object. Repeated requests send the
+        ETag in the If-None-Match header, if github reports the resource as unchanged (304) the
+        cached object is returned. Such responses have no body and do not count against the rate
+        limit. Any other unsuccessful response raises an exception.
+        """
+        header = {}
+        cached = self._etag_cache.get(url)
+        if cached is not None:
+            header["If-None-Match"] = cached[0]
+
+        response = self._session.get(url, headers=header)
+        if response.status_code == 304 and cached is not None:
+            return cached[1]
+
+        self._checkResponse(response, "GET " + url)
+        js_obj = orjson.loads(response.content)
+        if response.status_code == 200 and "ETag" in response.headers:
+            self._etag_cache[url] = (response.headers["ETag"], js_obj)
+        return js_obj
+
+    async def _getJSONAsync(self, url, session):
+        """Asynchronous counterpart of _getJSON making use of an asynchronous client."""
+        header = {}
+        cached = self._etag_cache.get(url)
+        if cached is not None:
+            header["If-None-Match"] = cached[0]
+
+        response = await session.get(url, headers=header)
+        if response.status_code == 304 and cached is not None:
+            return cached[1]
+
+        self._checkResponse(response, "GET " + url)
+        js_obj = orjson.loads(response.content)
+        if response.status_code == 200 and "ETag" in response.headers:
+            self._etag_cache[url] = (response.headers["ETag"], js_obj)
+        return js_obj
 
     def _fillTree(self, current_node, branch):
         """
         Creates a content tree of the branch
 
-        This is an internal method that is meant to be used recursively to grab the contents of a
-        branch of a remote repository.
+        This is an internal method that grabs the contents of a branch of a remote repository.
+        The directories are requested concurrently, so the walk costs roughly one round trip per
+        level of the tree rather than one per directory.
+
+        Deprecated: getBranchTreeFast retrieves the whole tree in a single request, this walk is
+        only kept as a fallback for trees too large for the git trees api.
         """
-        nodes = current_node.getNodes()
-        for node in nodes:
+        asyncio.run(self._fillTreeAsync(current_node, branch))
+
+    def _asyncSession(self):
+        """Creates an asynchronous HTTP/2 client authenticated with the access token of the app."""
+        header = {
+            "Authorization": "token " + self._access_token,
+            "Accept": self._api_version,
+            "Content-Type": "application/json",
+        }
+        return httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+                retries=3,
+            ),
+            headers=header,
+            timeout=httpx.Timeout(30.0),
+            follow_redirects=True,
+        )
 
-            js_obj = self._PYCURL(
-                self._header,
-                self._repo_url + "/contents/" + node.getPath(),
-                custom_data={"branch": branch},
+    async def _fillTreeAsync(self, current_node, branch):
+        """Opens a shared asynchronous client and concurrently fills the children of current_node."""
+        # Bound the number of requests in flight to respect the github secondary rate limits
+        sem = asyncio.Semaphore(20)
+        async with self._asyncSession() as session:
+            await asyncio.gather(
+                *[
+                    self._fillNodeAsync(node, branch, session, sem)
+                    for node in current_node.getNodes()
+                ]
             )
 
-            if isinstance(js_obj, list):
-                for ob in js_obj:
-                    node.insert(ob["name"], ob["type"])
-            else:
-                node.insert(js_obj["name"], js_obj["type"])
+    async def _fillNodeAsync(self, node, branch, session, sem):
+        """Records the contents of node and then recursively fills its child nodes."""
+        async with sem:
+            js_obj = await self._getJSONAsync(
+                self._repo_url
+                + "/contents/"
+                + node.getPath()
+                + "?ref="
+                + quote(branch, safe=""),
+                session,
+            )
 
-            self._fillTree(node, branch)
+        if isinstance(js_obj, list):
+            for ob in js_obj:
+                node.insert(ob["name"], ob["type"])
+        else:
+            node.insert(js_obj["name"], js_obj["type"])
+
+        await asyncio.gather(
+            *[
+                self._fillNodeAsync(child, branch, session, sem)
+                for child in node.getNodes()
+            ]
+        )
 
     def _getBranches(self):
-        """Internal method for getting a list of the branches that are available on github."""
-        page_found = True
-        page_index = 1
+        """
+        Internal method for getting a list of the branches that are available on github.
+
+        The branches are requested from the GraphQL api, a page of up to 100 branches is returned
+        per request containing only the name and latest commit sha of each branch.
+        """
         self._branches = []
+        self._branches_set = set()
         self._branch_current_commit_sha = {}
-        while page_found:
-            page_found = False
-            js_obj_list = self._PYCURL(
-                self._header, self._repo_url + "/branches?page={}".format(page_index)
-            )
-            page_index = page_index + 1
-            for js_obj in js_obj_list:
-                page_found = True
-                self._branches.append(js_obj["name"])
-                self._branch_current_commit_sha.update(
-                    {js_obj["name"]: js_obj["commit"]["sha"]}
-                )
+        variables = {"owner": self._user, "name": self._repo_name, "cursor": None}
+        has_next_page = True
+        while has_next_page:
+            js_obj = self._gql(GitHubApp._branches_query, variables)
+            has_next_page = self._recordBranches(js_obj, variables)
+
+    async def _getBranchesAsync(self, session):
+        """Asynchronous counterpart of _getBranches making use of an asynchronous client."""
+        self._branches = []
+        self._branches_set = set()
+        self._branch_current_commit_sha = {}
+        variables = {"owner": self._user, "name": self._repo_name, "cursor": None}
+        has_next_page = True
+        while has_next_page:
+            js_obj = await self._gqlAsync(GitHubApp._branches_query, variables, session)
+            has_next_page = self._recordBranches(js_obj, variables)
+
+    def _recordBranches(self, js_obj, variables):
+        """
+        Records a page of branches returned by the branches query
+
+        The cursor in variables is advanced to the end of the page, returns whether there is
+        another page of branches to request.
+        """
+        refs = js_obj["repository"]["refs"]
+        for ref in refs["nodes"]:
+            self._branches.append(ref["name"])
+            self._branches_set.add(ref["name"])
+            self._branch_current_commit_sha.update({ref["name"]: ref["target"]["oid"]})
+        variables["cursor"] = refs["pageInfo"]["endCursor"]
+        return refs["pageInfo"]["hasNextPage"]
 
     def getBranchMergingWith(self, branch):
         """Gets the name of the target branch of `branch` which it will merge with."""
-        js_obj_list = self._PYCURL(self._header, self._repo_url + "/pulls")
+        js_obj_list = orjson.loads(self._session.get(self._repo_url + "/pulls").content)
         self._log.info(
             "Checking if branch is open as a pr and what branch it is targeted to merge with.\n"
         )
@@ -391,7 +637,7 @@ class GitHubApp:
         Gets the branches of the repository
 
         This method will check to see if branches have already been collected from the github
-        RESTful api. If the branch tree has not been collected it will update the branches
+        api. If the branch tree has not been collected it will update the branches
         attribute.
         """
         if not self._branches:
@@ -409,10 +655,12 @@ class GitHubApp:
         """
         Determine if branch exists
 
-        This method will determine if a branch exists on the github repository by pinging the
-        github api.
+        This method will determine if a branch exists on the github repository. The branches are
+        only requested from the github api the first time, subsequent calls use the cached set.
         """
-        return branch in self.getBranches()
+        if not self._branches:
+            self._getBranches()
+        return branch in self._branches_set
 
     def refreshBranchCache(self):
         """ "
@@ -448,14 +696,14 @@ class GitHubApp:
             )
             raise Exception(error_msg)
 
-        self._PYCURL(
-            self._header,
+        self._session.post(
             self._repo_url + "/git/refs",
-            option="POST",
-            custom_data={
-                "ref": "refs/heads/" + branch,
-                "sha": self._branch_current_commit_sha[branch_to_fork_from],
-            },
+            content=orjson.dumps(
+                {
+                    "ref": "refs/heads/" + branch,
+                    "sha": self._branch_current_commit_sha[branch_to_fork_from],
+                }
+            ),
         )
 
     def getContents(self, branch=None):
@@ -467,21 +715,88 @@ class GitHubApp:
         """
         if branch is None:
             branch = self._default_branch
-        # 1. Check if file exists if so get SHA
-        js_obj = self._PYCURL(
-            self._header,
-            self._repo_url + "/contents?ref=" + branch,
-            custom_data={"branch": branch},
+        # 1. Get the entries of the root tree of the branch
+        js_obj = self._gql(
+            GitHubApp._contents_query,
+            {"owner": self._user, "name": self._repo_name, "expression": branch + ":"},
         )
 
         contents = {}
-        if isinstance(js_obj, list):
-            # Cycle through list to try to find the right object
-            for obj in js_obj:
-                contents[obj["name"]] = obj["sha"]
+        tree = js_obj["repository"]["object"]
+        if tree is not None:
+            for entry in tree["entries"]:
+                contents[entry["name"]] = entry["oid"]
 
         return contents
 
+    @staticmethod
+    def _checkResponse(response, action):
+        """Raises an exception describing the action if github did not report success."""
+        if not response.is_success:
+            raise Exception(
+                "%s failed with status %d: %s"
+                % (action, response.status_code, response.text)
+            )
+
+    @staticmethod
+    def _encodeFile(file_name):
+        """
+        Returns the contents of a file base64 encoded as an ascii string
+
+        The file is memory mapped rather than read into a buffer, so large binary files such as
+        images are not held in memory in both their raw and encoded form.
+        """
+        # b is needed if it is a png or image file/ binary file
+        with open(file_name, "rb") as f:
+            # Empty files cannot be memory mapped
+            if os.fstat(f.fileno()).st_size == 0:
+                return ""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return base64.b64encode(mm).decode("ascii")
+
+    @staticmethod
+    def _gitBlobSha(file_name):
+        """
+        Returns the git blob sha of a file
+
+        This is the sha github reports for a file with the same contents, comparing the two
+        determines whether uploading the file would change anything.
+        """
+        h = hashlib.sha1()
+        with open(file_name, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            h.update(b"blob %d\0" % size)
+            # Empty files cannot be memory mapped
+            if size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    h.update(mm)
+        return h.hexdigest()
+
+    def _getFileSha(self, file_name, branch):
+        """
+        Returns the sha of a single file in a branch
+
+        Only the sha of the requested file is returned by the GraphQL api, rather than its contents
+        or the listing of the whole directory. If the file does not exist in the branch None is
+        returned.
+        """
+        js_obj = self._gql(
+            GitHubApp._file_query,
+            {
+                "owner": self._user,
+                "name": self._repo_name,
+                "expression": branch + ":" + file_name,
+            },
+        )
+        git_object = js_obj["repository"]["object"]
+        if git_object is None:
+            return None
+        if git_object["__typename"] != "Blob":
+            raise Exception(
+                "Path (%s) in branch:%s is not a file" % (file_name, branch)
+            )
+        return git_object["oid"]
+
     def upload(self, file_name, branch=None, use_wiki=False, wiki_state="hard"):
         """
         This method attempts to upload a file to the specified branch.
@@ -554,21 +869,23 @@ class GitHubApp:
             error_msg = "branch: " + branch + " does not exist in repository."
             raise Exception(error_msg)
 
-        contents = self.getContents(branch)
+        sha = self._getFileSha(os.path.basename(os.path.normpath(file_name)), branch)
 
-        file_found = False
-        if os.path.basename(os.path.normpath(file_name)) in contents:
+        file_found = sha is not None
+        if file_found:
             self._log.warning(
                 "File (%s) already exists in branch:%s"
                 % (os.path.basename(os.path.normpath(file_name)), branch)
             )
-            file_found = True
+            if sha == self._gitBlobSha(file_name):
+                self._log.info(
+                    "File (%s) is unchanged, skipping upload"
+                    % os.path.basename(os.path.normpath(file_name))
+                )
+                return
 
         # 2. convert file into base64 format
-        # b is needed if it is a png or image file/ binary file
-        with open(file_name, "rb") as f:
-            data = f.read()
-        encoded_file = base64.b64encode(data)
+        encoded_file = self._encodeFile(file_name)
 
         # 3. upload the file, overwrite if exists already
         custom_data = {
@@ -580,11 +897,11 @@ class GitHubApp:
             ),
             "name": self._name,
             "branch": branch,
-            "content": encoded_file.decode("ascii"),
+            "content": encoded_file,
         }
 
         if file_found:
-            custom_data["sha"] = contents[os.path.basename(os.path.normpath(file_name))]
+            custom_data["sha"] = sha
 
         self._log.info(
             "Uploading file (%s) to branch (%s)"
@@ -596,7 +913,97 @@ class GitHubApp:
             + os.path.basename(os.path.normpath(file_name))
         )
 
-        self._PYCURL(self._header, https_url_to_file, "PUT", custom_data)
+        self._session.put(https_url_to_file, content=orjson.dumps(custom_data))
+
+    def uploadMany(self, files, branch=None):
+        """
+        This method uploads several files to the specified branch in a single commit.
+
+        Rather than creating a commit per file with the contents api, a blob is created for each
+        file, the blobs are then added to a new tree based on the tree of the latest commit of the
+        branch. A single commit of the new tree is then created and the branch is updated to point
+        to it. Existing files with the same names are overwritten.
+        """
+        if not files:
+            return
+        if branch is None:
+            branch = self._default_branch
+
+        if self._create_branch:
+            self.createBranch(branch)
+        elif not self.branchExist(branch):
+            error_msg = "branch: " + branch + " does not exist in repository."
+            raise Exception(error_msg)
+
+        # 1. create a blob for each of the files
+        blob_shas = asyncio.run(self._createBlobsAsync(files))
+
+        # 2. get the latest commit of the branch and the tree it points to
+        response = self._session.get(self._repo_url + "/git/ref/heads/" + branch)
+        self._checkResponse(response, "Getting the reference of branch " + branch)
+        parent_sha = orjson.loads(response.content)["object"]["sha"]
+        response = self._session.get(self._repo_url + "/git/commits/" + parent_sha)
+        self._checkResponse(response, "Getting commit " + parent_sha)
+        base_tree_sha = orjson.loads(response.content)["tree"]["sha"]
+
+        # 3. create a tree containing the new blobs
+        file_names = [os.path.basename(os.path.normpath(fil)) for fil in files]
+        tree = [
+            {"path": name, "mode": "100644", "type": "blob", "sha": sha}
+            for name, sha in zip(file_names, blob_shas)
+        ]
+        response = self._session.post(
+            self._repo_url + "/git/trees",
+            content=orjson.dumps({"base_tree": base_tree_sha, "tree": tree}),
+        )
+        self._checkResponse(response, "Creating the tree")
+        tree_sha = orjson.loads(response.content)["sha"]
+
+        # 4. commit the tree and move the branch to the new commit
+        self._log.info(
+            "Uploading files (%s) to branch (%s)" % (", ".join(file_names), branch)
+        )
+        response = self._session.post(
+            self._repo_url + "/git/commits",
+            content=orjson.dumps(
+                {
+                    "message": "%s uploading files %s"
+                    % (self._name, ", ".join(file_names)),
+                    "tree": tree_sha,
+                    "parents": [parent_sha],
+                }
+            ),
+        )
+        self._checkResponse(response, "Creating the commit")
+        commit_sha = orjson.loads(response.content)["sha"]
+
+        response = self._session.patch(
+            self._repo_url + "/git/refs/heads/" + branch,
+            content=orjson.dumps({"sha": commit_sha}),
+        )
+        self._checkResponse(response, "Updating the reference of branch " + branch)
+        self._branch_current_commit_sha[branch] = commit_sha
+
+    async def _createBlobsAsync(self, files):
+        """Concurrently creates a blob for each file and returns the list of blob shas."""
+        # Bound the number of files that are encoded and held in memory at the same time
+        sem = asyncio.Semaphore(4)
+        async with self._asyncSession() as session:
+            return await asyncio.gather(
+                *[self._createBlobAsync(fil, session, sem) for fil in files]
+            )
+
+    async def _createBlobAsync(self, file_name, session, sem):
+        """Creates a blob from the base64 encoded contents of file_name and returns its sha."""
+        async with sem:
+            # Encoding is blocking, run it in a thread so it does not stall the event loop
+            encoded_file = await asyncio.to_thread(self._encodeFile, file_name)
+            response = await session.post(
+                self._repo_url + "/git/blobs",
+                content=orjson.dumps({"content": encoded_file, "encoding": "base64"}),
+            )
+        self._checkResponse(response, "Creating a blob for file " + file_name)
+        return orjson.loads(response.content)["sha"]
 
     def getBranchTree(self, branch):
         """
@@ -605,9 +1012,13 @@ class GitHubApp:
         Method will grab the contents of the specified branch from the remote repository. It will
         return the contents as a tree object.
         """
-        # 1. Check if file exists
-        js_obj = self._PYCURL(
-            self._header, self._repo_url + "/contents", "PUT", {"branch": branch}
+        # The walk inserts into the tree, start from an empty one so that a tree that was already
+        # filled, e.g. by the prefetch, is not duplicated
+        self._parth_root = Node()
+
+        # 1. Get the contents of the root directory of the branch
+        js_obj = self._getJSON(
+            self._repo_url + "/contents?ref=" + quote(branch, safe="")
         )
 
         for obj in js_obj:
@@ -615,6 +1026,68 @@ class GitHubApp:
 
         self._fillTree(self._parth_root, branch)
 
+    def getBranchTreeFast(self, branch):
+        """
+        Gets the contents of a branch as a tree using a single request
+
+        The git trees api is used to grab the full recursive listing of the branch in one
+        response, the tree object is then reconstructed locally. If github truncates
+        the response, because the tree is too large, the directory by directory walk is used
+        instead.
+        """
+        if not self.branchExist(branch):
+            error_msg = "branch: " + branch + " does not exist in repository."
+            raise Exception(error_msg)
+
+        js_obj = self._getJSON(self._treeUrl(branch))
+        if "tree" not in js_obj:
+            raise Exception(
+                "Could not get the tree of branch %s: %s"
+                % (branch, js_obj.get("message", ""))
+            )
+
+        if js_obj.get("truncated", False):
+            self._log.warning(
+                "Tree of branch %s is truncated, falling back to recursive walk"
+                % branch
+            )
+            self.getBranchTree(branch)
+            return
+
+        self._parth_root = self._buildTree(js_obj["tree"])
+
+    def _treeUrl(self, branch):
+        """
+        Returns the url of the recursive tree of a branch
+
+        The tree is requested by branch name rather than commit sha, so that repeated requests use
+        the same url and are answered from the ETag cache until the branch moves. The name is
+        percent encoded, as branch names may contain characters such as "/" or "#".
+        """
+        return self._repo_url + "/git/trees/" + quote(branch, safe="") + "?recursive=1"
+
+    @staticmethod
+    def _buildTree(entries):
+        """
+        Builds a tree of nodes from the flat list of entries returned by the git trees api
+
+        The entries are listed such that a directory always appears before its contents, so the
+        parent node of each entry has already been created when the entry is reached.
+        """
+        root = Node()
+        nodes = {"": root}
+        for entry in entries:
+            parent_path, _, name = entry["path"].rpartition("/")
+            parent = nodes[parent_path]
+            if entry["type"] == "tree":
+                parent.insert(name, "dir")
+                nodes[entry["path"]] = parent.getNodes()[-1]
+            elif entry["type"] == "blob":
+                parent.insert(name, "file")
+            else:
+                parent.insert(name, entry["type"])
+        return root
+
     def cloneWikiRepo(self, wiki_state="hard"):
         """
         Clone a git repo
@@ -693,11 +1166,9 @@ class GitHubApp:
         if target_url != "":
             custom_data_tmp["target_url"] = target_url
 
-        self._PYCURL(
-            self._header,
+        self._session.post(
             self._repo_url + "/statuses/" + commit_sha,
-            "POST",
-            custom_data_tmp,
+            content=orjson.dumps(custom_data_tmp),
         )
 
     def getStatus(self):
@@ -709,7 +1180,7 @@ class GitHubApp:
             )
 
         # 1. Check if file exists if so get SHA
-        js_obj = self._PYCURL(
-            self._header, self._repo_url + "/commits/Add_to_dev/statuses"
+        js_obj = orjson.loads(
+            self._session.get(self._repo_url + "/commits/Add_to_dev/statuses").content
         )
         return js_obj
@@ -40,8 +40,9 @@ setup(
         "numpy",
         "pyjwt",
         "argparse",
-        "pycurl",
-        "pem",
+        "httpx[http2]",
+        "orjson",
+        "cryptography",
         "gitpython",
     ],
     scripts=["bin/parthenon_metrics_app.py"],